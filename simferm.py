@@ -3,11 +3,20 @@
 import os
 import sys
 import argparse
+import asyncio
+import http.client
+import json
 import random
-import subprocess
 import time
-from datetime import datetime
-import yaml
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+# aiohttp is optional; without it updates go through the standard library HTTP client
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -30,6 +39,31 @@ DEFAULTS = {
 # ========================
 script_version = 39
 
+# ========================
+# Log State
+# ========================
+_LOG_BATCH = 32  # Progress records held in memory before writing to the log file
+_log_buf: list[bytes] = []
+
+# Log record templates, pre-encoded since the log file is written in binary mode
+_LOG_START_FMT = ("%s, Simulation Starting. Tilt Color: %s, Starting Gravity: %.4f, "
+                  "Starting Temperature: %.1f °F, Run Time: %d minutes, "
+                  "Final Gravity: %.4f, Final Temperature: %.1f °F\n").encode('utf-8')
+_LOG_SUMMARY_FMT = ("%s, Version %d, Simulation at Start. "
+                    "Starting Temperature: %.1f °F, Starting Gravity: %.4f, Tilt Color: %s\n").encode('utf-8')
+_LOG_END_FMT = ("%s: Version %d: Simulation Complete. "
+                "Final Temperature: %.1f °F, Final Gravity: %.4f, Tilt Color: %s\n").encode('utf-8')
+
+# Static pieces of a progress record, joined around the per-tick fields
+_LOG_PREFIX = b": Current Temperature: "
+_LOG_MID1 = " °F, Current Gravity: ".encode('utf-8')
+_LOG_MID2 = b", Tilt Color: "
+_LOG_SUFFIX = b"\n"
+
+# Last formatted log timestamp and the epoch second it was formatted for
+_ts_sec = None
+_ts_bytes = b''
+
 # ========================
 # Function Definitions
 # ========================
@@ -38,49 +72,163 @@ def generate_random_temp_increment():
     """Generates a small random temperature increment."""
     return random.uniform(0.000, 0.099)
 
-def update_log(log_file, timestamp, script_version, current_temp_fahrenheit, color, gravity, start_temp_fahrenheit, og, is_start=False, is_end=False):
-    """Logs the simulation progress to the log file."""
+def current_timestamp():
+    """Returns the current local time formatted for the log (as bytes), reformatting only when the second changes."""
+    global _ts_sec, _ts_bytes
+    sec = int(time.time())
+    if sec != _ts_sec:
+        _ts_bytes = time.strftime('%Y-%m-%d, %H:%M:%S', time.localtime(sec)).encode('utf-8')
+        _ts_sec = sec
+    return _ts_bytes
+
+def build_trajectory(start_temp, step, gravity, final_gravity, g_step, ticks):
+    """Precomputes the temperature (°F) reported on each tick and the gravity before each tick and after the last one.
+
+    Values are stepped cumulatively, as the tick loop used to, so the reported readings round the same way.
+    """
+    temps = []
+    gravities = [gravity]
+    for _ in range(ticks):
+        start_temp += step
+        temps.append(start_temp / 1000 * 9/5 + 32)
+        gravity = max(final_gravity, gravity - g_step)
+        gravities.append(gravity)
+    return temps, gravities
+
+def flush_log(log_file):
+    """Writes the buffered log records to the (unbuffered) log file in one gathered write."""
+    if not _log_buf:
+        return
     try:
-        if is_start:
-            log_entry = (f"{timestamp.strftime('%Y-%m-%d, %H:%M:%S')}, Simulation Starting. "
-                         f"Tilt Color: {color}, "
-                         f"Starting Gravity: {gravity:.4f}, "
-                         f"Starting Temperature: {current_temp_fahrenheit:.1f} °F, "
-                         f"Run Time: {DEFAULTS['time']} minutes, "
-                         f"Final Gravity: {DEFAULTS['fg']:.4f}, "
-                         f"Final Temperature: {DEFAULTS['finaltemp']:.1f} °F\n")
-        elif is_end:
-            log_entry = (f"{timestamp.strftime('%Y-%m-%d, %H:%M:%S')}, Version {script_version}, Simulation at Start. "
-                         f"Starting Temperature: {start_temp_fahrenheit:.1f} °F, Starting Gravity: {og:.4f}, Tilt Color: {color}\n")
-            log_file.write(log_entry)
-            log_entry = (f"{timestamp.strftime('%Y-%m-%d, %H:%M:%S')}: Version {script_version}: Simulation Complete. "
-                         f"Final Temperature: {current_temp_fahrenheit:.1f} °F, "
-                         f"Final Gravity: {gravity:.4f}, Tilt Color: {color}\n")
+        if hasattr(os, 'writev'):
+            written = os.writev(log_file.fileno(), _log_buf)
         else:
-            log_entry = (f"{timestamp.strftime('%Y-%m-%d, %H:%M:%S')}: Current Temperature: {current_temp_fahrenheit:.1f} °F, "
-                         f"Current Gravity: {gravity:.4f}, Tilt Color: {color}\n")
-        
-        log_file.write(log_entry)
-        log_file.flush()
+            written = 0  # No gathered writes on this platform (e.g. Windows)
+
+        # Finish off anything writev did not get to
+        if written < sum(len(record) for record in _log_buf):
+            remaining = memoryview(b''.join(_log_buf))[written:]
+            while remaining:
+                remaining = remaining[log_file.write(remaining):]
     except Exception as e:
         print(f"Error updating log file: {e}")
+    _log_buf.clear()
+
+def log_start(log_file, cfg, timestamp, current_temp_fahrenheit, color, gravity):
+    """Logs the start of the simulation and writes it out immediately."""
+    _log_buf.append(_LOG_START_FMT % (timestamp, color, gravity, current_temp_fahrenheit,
+                                      cfg.time, cfg.fg, cfg.finaltemp))
+    flush_log(log_file)
+
+def log_progress(timestamp, temp_b, gravity_b, color):
+    """Buffers a progress record from pre-formatted fields; the caller writes the batch out with flush_log."""
+    _log_buf.append(b"".join((timestamp, _LOG_PREFIX, temp_b, _LOG_MID1, gravity_b, _LOG_MID2, color, _LOG_SUFFIX)))
+
+def log_end(log_file, cfg, timestamp, current_temp_fahrenheit, color, gravity):
+    """Logs the start summary and end of the simulation and writes them out immediately."""
+    _log_buf.append(_LOG_SUMMARY_FMT % (timestamp, script_version, cfg.starttemp, cfg.og, color))
+    _log_buf.append(_LOG_END_FMT % (timestamp, script_version, current_temp_fahrenheit, gravity, color))
+    flush_log(log_file)
+
+async def send_update(session, url, base_params, temp_str, gravity_str):
+    """Sends the simulated values to the target server over the shared HTTP session."""
+    try:
+        params = {**base_params, 'sg': gravity_str, 'temp': temp_str}
+        async with session.get(url, params=params) as response:
+            await response.read()
+    except Exception as e:
+        # Timeouts carry no message, so include the exception type
+        print(f"Error sending update to Tilt-Sim: {type(e).__name__}: {e}")
+
+def send_update_sync(conn, ip_addr, path, base_params, temp_str, gravity_str):
+    """Sends the simulated values to the target server over a persistent http.client connection.
 
-def execute_curl_command(ip_addr, color, current_temp_fahrenheit, gravity):
-    """Executes a curl command to update the target server with simulated values."""
+    The connection is opened on first use and returned for the next update (None if it could not be created).
+    """
     try:
-        curl_command = (f'curl "http://{ip_addr}/setTilt?name={color}&active=on&sg={gravity:.4f}&temp={current_temp_fahrenheit:.1f}"')
-        subprocess.run(curl_command, shell=True)
+        if conn is None:
+            conn = http.client.HTTPConnection(ip_addr, timeout=5)
+        params = {**base_params, 'sg': gravity_str, 'temp': temp_str}
+        conn.request("GET", f"{path}?{urlencode(params, safe='*')}")
+        conn.getresponse().read()
     except Exception as e:
-        print(f"Error executing curl command: {e}")
+        if conn is not None:
+            conn.close()  # Reconnect on the next update
+        print(f"Error sending update to Tilt-Sim: {e}")
+    return conn
+
+async def run_sender(queue, ip_addr, color):
+    """Sends queued updates to the target server until a None sentinel is received."""
+    # Path and fixed query parameters are the same for every update
+    path = '/setTilt'
+    base_params = {'name': color, 'active': 'on'}
+
+    if aiohttp is None:
+        # Keep one dedicated thread for the stdlib sender instead of borrowing the default executor
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=1)
+        conn = None
+        try:
+            while (update := await queue.get()) is not None:
+                temp_str, gravity_str = update
+                conn = await loop.run_in_executor(pool, send_update_sync, conn, ip_addr, path, base_params,
+                                                  temp_str, gravity_str)
+        finally:
+            pool.shutdown(wait=True)
+            if conn is not None:
+                conn.close()
+        return
+
+    url = f"http://{ip_addr}{path}"
+    connector = aiohttp.TCPConnector(limit=1, keepalive_timeout=75)
+    timeout = aiohttp.ClientTimeout(total=5)  # Same limit as the http.client fallback
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        while (update := await queue.get()) is not None:
+            temp_str, gravity_str = update
+            await send_update(session, url, base_params, temp_str, gravity_str)
+
+def queue_update(queue, temp_str, gravity_str):
+    """Queues an update for the sender, dropping the oldest one if the queue is full."""
+    try:
+        queue.put_nowait((temp_str, gravity_str))
+    except asyncio.QueueFull:
+        queue.get_nowait()
+        queue.put_nowait((temp_str, gravity_str))
+
+def discard_pending(queue):
+    """Drops updates the sender has not picked up yet; returns True if any were dropped."""
+    dropped = False
+    while not queue.empty():
+        queue.get_nowait()
+        dropped = True
+    return dropped
 
 def read_config_file(file_path):
-    """Reads the configuration file if it exists."""
+    """Reads the configuration file if it exists, picking the parser from its extension (.toml, .json, else YAML)."""
+    ext = os.path.splitext(file_path)[1].lower()
     try:
+        if ext == '.toml':
+            import tomllib
+            with open(file_path, 'rb') as file:
+                return tomllib.load(file)
+        if ext == '.json':
+            with open(file_path, 'r') as file:
+                return json.load(file)
+
+        # PyYAML is only needed for YAML configs; prefer its libyaml-backed loader
+        import yaml
+        try:
+            from yaml import CSafeLoader as Loader
+        except ImportError:
+            from yaml import SafeLoader as Loader
         with open(file_path, 'r') as file:
-            return yaml.safe_load(file)
+            return yaml.load(file, Loader=Loader)
     except FileNotFoundError:
         return None  # Silently return None if the file is not found
-    except yaml.YAMLError as e:
+    except ImportError as e:
+        print(f"Cannot read config file {file_path}: {e}")
+        return None
+    except Exception as e:
         print(f"Error parsing config file {file_path}: {e}")
         return None
 
@@ -92,14 +240,14 @@ def determine_direction(start_temp, end_temp):
 # Main Function
 # ========================
 
-def main():
+async def main():
     parser = argparse.ArgumentParser(
         description="Simulate a fermentation using Tilt-Sim (https://github.com/spouliot/tilt-sim)",
         formatter_class=lambda prog: argparse.HelpFormatter(prog, max_help_position=30)
     )
 
     # Arguments
-    parser.add_argument('--config', type=str, help='Path to the YAML configuration file.')
+    parser.add_argument('--config', type=str, help='Path to the configuration file (YAML, TOML or JSON).')
     parser.add_argument('--ip', type=str, help='IP address of the Tilt-Sim device')
     parser.add_argument('--color', type=str, help='Tilt color from Tilt-Sim device')
     parser.add_argument('--starttemp', type=float, help='Starting temperature (°F)')
@@ -121,77 +269,105 @@ def main():
         if value is not None:
             DEFAULTS[key] = value
 
+    # Snapshot the known settings for attribute access; nothing below modifies them
+    cfg = SimpleNamespace(**{key: DEFAULTS[key] for key in ('ip', 'color', 'starttemp', 'finaltemp', 'time', 'og', 'fg')})
+
     # Convert temperatures to milli-degrees Celsius
-    start_temp = int((DEFAULTS['starttemp'] - 32) * 5/9 * 1000)
-    end_temp = int((DEFAULTS['finaltemp'] - 32) * 5/9 * 1000)
+    start_temp = int((cfg.starttemp - 32) * 5/9 * 1000)
+    end_temp = int((cfg.finaltemp - 32) * 5/9 * 1000)
 
     # Determine the direction of temperature change
     direction = determine_direction(start_temp, end_temp)
 
     total_temp_change = end_temp - start_temp
-    number_of_changes = DEFAULTS['time'] * 60  # Total number of changes (1 per second)
+    number_of_changes = cfg.time * 60  # Total number of changes (1 per second)
     temp_change_per_interval = total_temp_change / number_of_changes
 
-    gravity = max(DEFAULTS['og'], DEFAULTS['fg'])  # Start with the higher value (OG)
-    final_gravity = min(DEFAULTS['og'], DEFAULTS['fg'])  # Target the lower value (FG)
-
-    start_time = time.time()
+    gravity = max(cfg.og, cfg.fg)  # Start with the higher value (OG)
+    final_gravity = min(cfg.og, cfg.fg)  # Target the lower value (FG)
 
     # Convert initial temperature to Fahrenheit for logging
     current_temp_fahrenheit = start_temp / 1000 * 9/5 + 32
-    start_temp_fahrenheit = DEFAULTS['starttemp']
 
     # CLI output at start of simulation
     print("Simulated fermentation started. Monitor log file for progress.")
 
     # Open log file, in same dir as simferm.py, in write mode to overwrite existing content
     log_file_path = os.path.join(SCRIPT_DIR, 'simferm.log')
-    with open(log_file_path, 'w') as log_file:
-        # Start of simulation run
-        timestamp = datetime.now()
-        update_log(log_file, timestamp, script_version, current_temp_fahrenheit, DEFAULTS['color'], gravity, start_temp_fahrenheit, DEFAULTS['og'], is_start=True)
-
-        # Run the simulation loop
-        for i in range(number_of_changes):
-            if (direction == "up" and start_temp >= end_temp) or (direction == "down" and start_temp <= end_temp):
-                break  # Exit loop if target temperature is reached
-            
-            # Adjust the temperature based on the direction
-            if direction == "up":
-                start_temp += abs(temp_change_per_interval)
-            else:  # direction == "down"
-                start_temp -= abs(temp_change_per_interval)
-
-            current_temp_fahrenheit = start_temp / 1000 * 9/5 + 32
 
-            # Update log file with current progress
-            timestamp = datetime.now()
-            update_log(log_file, timestamp, script_version, current_temp_fahrenheit, DEFAULTS['color'], gravity, start_temp_fahrenheit, DEFAULTS['og'])
+    # Loop-invariant values, bound once as locals for the tick loop
+    color = cfg.color
+    color_b = color.encode('utf-8')  # Log records are bytes
+    ip = cfg.ip
+    og = cfg.og
+    sign = 1 if direction == "up" else -1
+    step = sign * abs(temp_change_per_interval)
+    g_step = (og - final_gravity) / number_of_changes
 
-            # Execute curl command with updated values
-            execute_curl_command(DEFAULTS['ip'], DEFAULTS['color'], current_temp_fahrenheit, gravity)
+    # Precompute every tick up front (gravities has one extra, post-run entry that zip leaves out);
+    # nothing to simulate if the temperature does not change
+    ticks = number_of_changes if sign * (end_temp - start_temp) > 0 else 0
+    temps, gravities = build_trajectory(start_temp, step, gravity, final_gravity, g_step, ticks)
 
-            # Adjust gravity value towards Final Gravity (FG)
-            gravity_change = (DEFAULTS['og'] - final_gravity) / number_of_changes
-            gravity = max(final_gravity, gravity - gravity_change)
+    # Event loop clock (monotonic) used to schedule ticks on absolute deadlines
+    loop = asyncio.get_running_loop()
 
-            # Sleep to maintain accurate time interval
-            elapsed_time = time.time() - start_time
-            sleep_time = (i + 1) - elapsed_time
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+    # Updates are handed to a background sender so the tick loop never waits on the network
+    queue = asyncio.Queue(maxsize=16)
+    sender = asyncio.create_task(run_sender(queue, ip, color))
 
-        # Execute the final curl command to ensure the last update is sent
-        execute_curl_command(DEFAULTS['ip'], DEFAULTS['color'], current_temp_fahrenheit, gravity)
-
-        # End of simulation run - use the current (final) values
-        update_log(log_file, timestamp, script_version, current_temp_fahrenheit, DEFAULTS['color'], gravity, start_temp_fahrenheit, DEFAULTS['og'], is_end=True)
+    with open(log_file_path, 'wb', buffering=0) as log_file:  # Batches are written by flush_log
+        # Start of simulation run
+        timestamp = current_timestamp()
+        log_start(log_file, cfg, timestamp, current_temp_fahrenheit, color_b, gravity)
+
+        # Run the simulation loop; whatever is still buffered is written out even if the run is interrupted
+        try:
+            next_tick = loop.time() + 1.0
+            for current_temp_fahrenheit, tick_gravity in zip(temps, gravities):
+                # Format the readings once; the log record and the update share them
+                temp_str = f"{current_temp_fahrenheit:.1f}"
+                gravity_str = f"{tick_gravity:.4f}"
+
+                # Update log file with current progress
+                timestamp = current_timestamp()
+                log_progress(timestamp, temp_str.encode('ascii'), gravity_str.encode('ascii'), color_b)
+                if len(_log_buf) >= _LOG_BATCH:
+                    flush_log(log_file)
+
+                # Queue updated values for the sender
+                queue_update(queue, temp_str, gravity_str)
+
+                # Sleep until the next tick deadline so overhead does not accumulate
+                # (a late tick still yields once so the sender can run)
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                next_tick += 1.0
+
+            # Gravity keeps moving towards Final Gravity (FG) after the last tick is reported
+            gravity = gravities[-1]
+
+            # Stale updates the sender has not got to are dropped; only the final values still matter.
+            # Queue them unless the last tick's update already went out with the same values
+            # (the temperature is unchanged, so only the formatted gravity can differ).
+            dropped = discard_pending(queue)
+            final_gravity_str = f"{gravity:.4f}"
+            if dropped or not ticks or final_gravity_str != gravity_str:
+                queue_update(queue, f"{current_temp_fahrenheit:.1f}", final_gravity_str)
+            queue.put_nowait(None)
+
+            # End of simulation run - use the current (final) values; logged before waiting
+            # on the sender so a stalled Tilt-Sim cannot hold up the completion record
+            log_end(log_file, cfg, timestamp, current_temp_fahrenheit, color_b, gravity)
+
+            # At most the in-flight update and the final one remain, each bounded by the HTTP timeout
+            await sender
+        finally:
+            flush_log(log_file)
 
     # CLI output at end of simulation
     print("Simulated fermentation complete. Enjoy a simulated beer on me.")
 
-    sys.exit(0)
-
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
+    sys.exit(0)
 